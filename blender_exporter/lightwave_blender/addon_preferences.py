@@ -6,10 +6,11 @@ from bpy.props import (
 from bpy.types import AddonPreferences
 
 package_name = __import__(__name__.split('.')[0])
+_PKG = package_name.__package__
 
 
 class LightwavePreferences(AddonPreferences):
-    bl_idname = package_name.__package__
+    bl_idname = _PKG
 
     mesh_dir_name: StringProperty(
         name="Mesh Dir",
@@ -39,4 +40,4 @@ def unregister():
 
 
 def get_prefs() -> LightwavePreferences:
-    return bpy.context.preferences.addons[package_name.__package__].preferences
+    return bpy.context.preferences.addons[_PKG].preferences
@@ -1,11 +1,19 @@
 import bpy
+import math
 from .utils import *
+from .utils import _FLOAT_FORMAT
 from .defaults import *
 from .registry import SceneRegistry
 from .xml_node import XMLNode
 
 
-def _export_area_light(registry: SceneRegistry, instance_node, light: bpy.types.Light, inst: bpy.types.DepsgraphObjectInstance):
+_INV_4PI2 = 1 / (4 * math.pi * math.pi)
+
+# Same output as str_flat_array for three values
+_VEC3_FORMAT = ",".join([_FLOAT_FORMAT] * 3)
+
+
+def _export_area_light(registry: SceneRegistry, instance_node, light: bpy.types.Light, matrix_world: list[list[float]]):
     # Compute actual matrix
     # From my understanding, object transforms in Blender are always similarity transformations.
     # This means we do not need to worry about the angle formed by the spanning vectors of our
@@ -19,35 +27,35 @@ def _export_area_light(registry: SceneRegistry, instance_node, light: bpy.types.
         registry.warn(f"Unsupported light shape '{light.shape}'")
         scale_y = light.size
     
-    matrix_world = [ [ x for x in row ] for row in inst.matrix_world ]
+    matrix_world = [ row[:] for row in matrix_world ]
     lensqr_x = 0
     lensqr_y = 0
     for i in range(3):
         matrix_world[i][0] *= scale_x / 2
         matrix_world[i][1] *= scale_y / 2
         matrix_world[i][2] *= -1
-        lensqr_x += matrix_world[i][0] ** 2
-        lensqr_y += matrix_world[i][1] ** 2
+        lensqr_x += matrix_world[i][0] * matrix_world[i][0]
+        lensqr_y += matrix_world[i][1] * matrix_world[i][1]
 
     instance_node.add("shape", type="rectangle")
     transform = instance_node.add("transform")
     transform.add("matrix", value=str_flat_matrix(matrix_world))
 
-    return 1 / (16 * (lensqr_x * lensqr_y) ** 0.5)
+    return 1 / (16 * math.sqrt(lensqr_x * lensqr_y))
 
-def _export_point_light(registry: SceneRegistry, instance_node, light: bpy.types.Light, inst: bpy.types.DepsgraphObjectInstance):
+def _export_point_light(registry: SceneRegistry, instance_node, light: bpy.types.Light, matrix_world: list[list[float]]):
     radius = max(light.shadow_soft_size, 1e-3)
 
     instance_node.add("shape", type="sphere")
     transform = instance_node.add("transform")
     transform.add("scale", value=radius)
     transform.add("translate",
-        x=inst.matrix_world[0][3],
-        y=inst.matrix_world[1][3],
-        z=inst.matrix_world[2][3])
+        x=matrix_world[0][3],
+        y=matrix_world[1][3],
+        z=matrix_world[2][3])
 
     # I don't understand any of this either, but it's Blender's convention :-)
-    return 1 / (4 * (3.14159 * radius) ** 2)
+    return _INV_4PI2 / (radius * radius)
 
 def export_light(registry: SceneRegistry, inst):
     light = inst.object.data
@@ -55,14 +63,19 @@ def export_light(registry: SceneRegistry, inst):
         registry.warn("Light portals are not supported")
         return []
 
+    # Copy the matrix out of Blender once, indexing the RNA wrapper per element is slow
+    matrix_world = [ list(row) for row in inst.matrix_world ]
+    energy = light.energy
+    (r, g, b) = light.color[0:3]
+
     if light.type == "POINT" and light.shadow_soft_size < 1e-3:
-        power = str_flat_array([ light.energy * light.color[chan] for chan in range(3) ])
-        position = str_flat_array([ inst.matrix_world[dim][3] for dim in range(3) ])
+        power = _VEC3_FORMAT % (energy * r, energy * g, energy * b)
+        position = _VEC3_FORMAT % (matrix_world[0][3], matrix_world[1][3], matrix_world[2][3])
         return [XMLNode("light", type="point", position=position, power=power)]
 
     if light.type == "SUN":
-        intensity = str_flat_array([ light.energy * light.color[chan] for chan in range(3) ])
-        position = str_flat_array([ inst.matrix_world[dim][2] for dim in range(3) ])
+        intensity = _VEC3_FORMAT % (energy * r, energy * g, energy * b)
+        position = _VEC3_FORMAT % (matrix_world[0][2], matrix_world[1][2], matrix_world[2][2])
         return [XMLNode("light", type="directional", direction=position, intensity=intensity)]
 
     if registry.settings.enable_area_lights:
@@ -74,18 +87,16 @@ def export_light(registry: SceneRegistry, inst):
         instance_node = light_node
 
     if light.type == "POINT":
-        normalization = _export_point_light(registry, instance_node, light, inst)
+        normalization = _export_point_light(registry, instance_node, light, matrix_world)
     elif light.type == "AREA":
-        normalization = _export_area_light(registry, instance_node, light, inst)
+        normalization = _export_area_light(registry, instance_node, light, matrix_world)
     else:
         registry.warn(f"Light type {light.type} unsupported")
         return []
 
-    emission = [
-        normalization * light.energy * light.color[chan]
-        for chan in range(3)
-    ]
+    scale = normalization * energy
+    emission = _VEC3_FORMAT % (scale * r, scale * g, scale * b)
 
     instance_node.add("emission", type="lambertian").add(
-        "texture", name="emission", type="constant", value=str_flat_array(emission))
+        "texture", name="emission", type="constant", value=emission)
     return [light_node]
@@ -23,10 +23,15 @@ def _export_glass_bsdf_helper(registry: SceneRegistry, bsdf_node: RMNode, has_re
     has_roughness = bsdf_node.bl_node.distribution != 'SHARP'
     node = XMLNode("bsdf", type="roughdielectric" if has_roughness else "dielectric")
     node.add_child(export_node(registry, bsdf_node.input("IOR")), name="ior")
-    node.add_child(export_node(registry, bsdf_node.input("Color")), name="transmittance")
+    color = bsdf_node.input("Color")
+    transmittance = export_node(registry, color)
+    node.add_child(transmittance, name="transmittance")
     
     if has_reflectance:
-        node.add_child(export_node(registry, bsdf_node.input("Color")), name="reflectance")
+        # Linked textures are exported once and referenced by the registry,
+        # constant values can simply be copied over
+        reflectance = export_node(registry, color) if color.is_linked() else transmittance.clone()
+        node.add_child(reflectance, name="reflectance")
     else:
         node.add("texture", name="reflectance", type="constant", value=0)
     
@@ -58,7 +63,7 @@ def _export_glossy_bsdf(registry: SceneRegistry, bsdf_node: RMNode):
 def _is_black(v: list):
     if isinstance(v, float):
         return v == 0
-    return all((c == 0 for c in v[0:3]))
+    return v[0] == 0 and v[1] == 0 and v[2] == 0
 
 def _export_emission_helper(registry: SceneRegistry, color: RMInput, strength: RMInput):
     if not color.is_linked():
@@ -77,24 +82,27 @@ def _export_emission_helper(registry: SceneRegistry, color: RMInput, strength: R
     emission.add_child(export_node(registry, color, exposure=emission_scale), name="emission")
     return [emission]
 
+# (lightwave name, blender input identifier)
+_principled_inputs: list[tuple[str, str]] = [
+    ("baseColor", "Base Color"),
+    ("roughness", "Roughness"),
+    #("subsurface", "Subsurface"),
+    ("metallic", "Metallic"),
+    ("specular", "Specular"),
+    #("specularTint", "Specular Tint"),
+    #("transmission", "Transmission"),
+    #("anisotropic", "Anisotropic"),
+    #("sheen", "Sheen"),
+    #("sheenTint", "Sheen Tint"),
+    #("clearcoat", "Clearcoat"),
+    #("clearcoatRoughness", "Clearcoat Roughness"),
+    #("ior", "IOR"),
+]
+
 def _export_principled_bsdf(registry: SceneRegistry, bsdf_node: RMNode):
     node = XMLNode("bsdf", type="principled")
 
-    for (lw_name, bl_name) in [
-        ("baseColor", "Base Color"),
-        ("roughness", "Roughness"),
-        #("subsurface", "Subsurface"),
-        ("metallic", "Metallic"),
-        ("specular", "Specular"),
-        #("specularTint", "Specular Tint"),
-        #("transmission", "Transmission"),
-        #("anisotropic", "Anisotropic"),
-        #("sheen", "Sheen"),
-        #("sheenTint", "Sheen Tint"),
-        #("clearcoat", "Clearcoat"),
-        #("clearcoatRoughness", "Clearcoat Roughness"),
-        #("ior", "IOR"),
-    ]:
+    for (lw_name, bl_name) in _principled_inputs:
         node.add_child(export_node(registry, bsdf_node.input(bl_name)), name=lw_name)
     
     emission = _export_emission_helper(registry, bsdf_node.input("Emission"), bsdf_node.input("Emission Strength"))
@@ -114,6 +122,8 @@ _bsdf_handlers: dict[str, any] = {
     "ShaderNodeBackground": _export_emission,
 }
 
+_bsdf_dispatch = NodeDispatch(_bsdf_handlers)
+
 # @todo material type should be 'Material | World | Light'
 def export_material(registry: SceneRegistry, material: bpy.types.Material):
     if not material.use_nodes:
@@ -159,10 +169,8 @@ def _export_bsdf(registry: SceneRegistry, input: RMInput):
         return []
     
     result = []
-    for (typename, handler) in _bsdf_handlers.items():
-        if hasattr(bpy.types, typename) and isinstance(bsdf_node.bl_node, getattr(bpy.types, typename)):
-            result += handler(registry, bsdf_node) # registry.export(bsdf_node.bl_node, lambda unique_name: handler(registry, bsdf_node))
-            break
+    if (handler := _bsdf_dispatch.find(bsdf_node.bl_node)) is not None:
+        result += handler(registry, bsdf_node) # registry.export(bsdf_node.bl_node, handler, registry, bsdf_node)
     else:
         # treat as emission
         emission = XMLNode("emission", type="lambertian")
@@ -1,8 +1,9 @@
 import bpy
 import os
+import posixpath
+import shutil
 
 from .utils import *
-from .addon_preferences import get_prefs
 from .xml_node import XMLNode
 from .registry import SceneRegistry, Token
 from .node_graph import RMInput
@@ -20,7 +21,7 @@ def _export_default(registry: SceneRegistry, input: RMInput, exposure):
     if isinstance(value, float):
         value *= factor
     elif isinstance(value, list):
-        value = [ v * factor for v in value[0:3] ]
+        value = (value[0] * factor, value[1] * factor, value[2] * factor)
     return XMLNode("texture", type="constant", value=str_flat_array(value))
 
 def _export_scalar_value(registry: SceneRegistry, input: RMInput, exposure):
@@ -30,13 +31,45 @@ def _export_scalar_value(registry: SceneRegistry, input: RMInput, exposure):
 def _export_rgb_value(registry: SceneRegistry, input: RMInput, exposure):
     factor = exposure or 1
     node = input.linked_node().bl_node
-    default_value = [ v * factor for v in node.outputs[0].default_value[0:3] ]
-    return XMLNode("texture", type="constant", value=str_flat_array(default_value))
+    (r, g, b) = node.outputs[0].default_value[0:3]
+    return XMLNode("texture", type="constant", value=str_flat_array((r * factor, g * factor, b * factor)))
 
-def _export_image(registry: SceneRegistry, image, path, is_f32=False, keep_format=False):
-    if os.path.exists(path) and not registry.settings.overwrite_existing_textures:
+def _is_same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False  # At least one of them does not exist
+
+def _copy_image_file(source, path):
+    # Runs on the I/O thread pool, hence must not use the Blender API
+    if _is_same_file(source, path):
         return
+    shutil.copyfile(source, path)
+
+def _export_image(registry: SceneRegistry, image, path, is_f32=False, keep_format=False, source=None):
+    if not registry.settings.overwrite_existing_textures and os.path.exists(path):
+        return
+
+    # Unmodified images from disk do not need to be encoded again, and copying them
+    # does not involve Blender, so it can be done in the background
+    if keep_format and source is not None and not image.packed_file and not image.is_dirty and os.path.isfile(source):
+        registry.make_dirs(path)
+        registry.submit_io(_copy_image_file, source, path,
+                           on_error=lambda error: _save_image_after_failed_copy(registry, image, path, error))
+        return
+
+    registry.make_dirs(path)
+    _save_image(image, path, is_f32=is_f32, keep_format=keep_format)
+
+def _save_image_after_failed_copy(registry: SceneRegistry, image, path, error):
+    # Called on the main thread, a single texture must not abort the whole export
+    registry.warn(f"Could not copy image {image.name} ({error}), letting Blender write it instead")
+    try:
+        _save_image(image, path, keep_format=True)
+    except Exception as e:
+        registry.error(f"Could not export image {image.name}: {e}")
 
+def _save_image(image, path, is_f32=False, keep_format=False):
     # Make sure the image is loaded to memory, so we can write it out
     if not image.has_data:
         image.pixels[0]
@@ -61,18 +94,51 @@ def _export_image(registry: SceneRegistry, image, path, is_f32=False, keep_forma
         image.save_render(path)
 
 
+def _resolve_filepath(registry: SceneRegistry, filepath: str, library):
+    key = (filepath, library.name_full if library is not None else None)
+    if key in registry.resolved_paths:
+        return registry.resolved_paths[key]
+
+    # Searching for a case-correct variant stats every directory on the way, which is slow on network drives
+    # and not needed at all if the path as given already exists
+    abs_path = bpy.path.abspath(filepath, library=library)
+    if not os.path.exists(abs_path):
+        abs_path = bpy.path.abspath(bpy.path.resolve_ncase(filepath), library=library)
+
+    registry.resolved_paths[key] = abs_path
+    return abs_path
+
+
+def _claim_texture_path(registry: SceneRegistry, img_path: str, source=None):
+    # Textures are copied in the background, so two images must never write the same file (e.g., two different
+    # diffuse.png). If another image already claimed it, name.000.png, name.001.png, ... are used instead.
+    # Unmodified images copied from the same `source` file share their copy, which is reported by the second value
+    key = (source, img_path)
+    if source is not None and key in registry.texture_copies:
+        return (registry.texture_copies[key], True)
+
+    (stem, extension) = posixpath.splitext(img_path)
+    claimed = registry.claim_files(stem, lambda candidate: [candidate + extension])[0]
+    if source is not None:
+        registry.texture_copies[key] = claimed
+    return (claimed, False)
+
+
 def _handle_image(registry: SceneRegistry, image: bpy.types.Image):
-    tex_dir_name = get_prefs().tex_dir_name
+    # Only called once per image, as the image textures are memoized by image in registry.export
+    # The returned path ends up in the xml, so it is assembled with / as separator on all platforms
+    tex_dir_name = registry.tex_dir_name
 
     if image.source == 'GENERATED':
         img_name = image.name + \
             (".png" if not image.use_generated_float else ".exr")
-        img_path = os.path.join(tex_dir_name, img_name)
+        (img_path, _) = _claim_texture_path(registry, posixpath.join(tex_dir_name, img_name))
         _export_image(registry, image, os.path.join(registry.path, img_path), is_f32=image.use_generated_float)
-        return img_path.replace('\\', '/') # Ensure the image path is not using \ to keep the xml valid
+        return img_path
     elif image.source == 'FILE':
-        filepath = image.filepath_raw if image.filepath_raw is not None else image.filepath
-        img_path = bpy.path.abspath(bpy.path.resolve_ncase(filepath), library=image.library)
+        filepath = image.filepath_raw or image.filepath
+        img_path = _resolve_filepath(registry, filepath, image.library)
+        source_path = img_path
         try:
             img_path = bpy.path.relpath(img_path, start=registry.path)
         except:
@@ -98,21 +164,33 @@ def _handle_image(registry: SceneRegistry, image: bpy.types.Image):
                 else:
                     is_f32 = False
                     extension = ".png"
-                img_path = os.path.join(tex_dir_name, image.name + extension)
+                img_path = posixpath.join(tex_dir_name, image.name + extension)
             else:
                 keep_format = True
                 is_f32 = False  # Does not matter
-                img_path = os.path.join(tex_dir_name, img_name)
+                img_path = posixpath.join(tex_dir_name, img_name)
+
+            candidate = img_path
+            is_unmodified = keep_format and not image.packed_file and not image.is_dirty
+            (img_path, is_shared) = _claim_texture_path(registry, candidate, source=source_path if is_unmodified else None)
+            if is_shared:
+                # Another image exports the very same file already
+                return img_path
+            if is_unmodified and _is_same_file(source_path, os.path.join(registry.path, img_path)):
+                # The image already is where it would be copied to
+                return img_path
 
             try:
                 _export_image(registry, image, os.path.join(registry.path, img_path),
-                                is_f32=is_f32, keep_format=keep_format)
+                                is_f32=is_f32, keep_format=keep_format, source=source_path)
             except:
                 # Above failed, so give this a try
-                img_path = os.path.join(tex_dir_name, img_name)
+                fallback_path = posixpath.join(tex_dir_name, img_name)
+                if fallback_path != candidate:
+                    (img_path, _) = _claim_texture_path(registry, fallback_path)
                 _export_image(registry, image, os.path.join(registry.path, img_path),
-                                  is_f32=False, keep_format=True)
-        return img_path.replace('\\', '/') # Ensure the image path is not using \ to keep the xml valid
+                                  is_f32=False, keep_format=True, source=source_path)
+        return img_path
     else:
         registry.error(f"Image type {image.source} not supported")
         return None
@@ -124,7 +202,7 @@ def _export_image_texture(registry: SceneRegistry, input: RMInput, exposure):
         registry.error(f"Image node {bl_node.name} has no image")
         return _export_fallback()
 
-    def export(unique_name):
+    def export():
         img_path = _handle_image(registry, bl_node.image)
         kw = {}
 
@@ -157,7 +235,7 @@ def _export_env_image_texture(registry: SceneRegistry, input: RMInput, exposure)
         registry.error(f"Image node {bl_node.name} has no image")
         return _export_fallback()
 
-    def export(unique_name):
+    def export():
         img_path = _handle_image(registry, bl_node.image)
         kw = {}
 
@@ -192,15 +270,16 @@ _node_handlers: dict[str, any] = {
     "ShaderNodeNormalMap": _export_normal_map,
 }
 
+_node_dispatch = NodeDispatch(_node_handlers)
+
 def export_node(registry: SceneRegistry, input: RMInput, exposure=None) -> XMLNode:
     if not input.is_linked():
         return _export_default(registry, input, exposure)
     
     node = input.linked_node()
-    for (typename, handler) in _node_handlers.items():
-        if hasattr(bpy.types, typename) and isinstance(node.bl_node, getattr(bpy.types, typename)):
-            return registry.export(Token(str(node.bl_node.as_pointer()), node.bl_node.name),
-                                   lambda unique_name: handler(registry, input, exposure))
+    if (handler := _node_dispatch.find(node.bl_node)) is not None:
+        return registry.export(Token(str(node.bl_node.as_pointer()), node.bl_node.name),
+                               handler, registry, input, exposure)
     
     registry.error(f"Material {node.node_graph.name} has a node of type {type(node.bl_node).__name__} which is not supported")
     return _export_fallback()
@@ -2,6 +2,9 @@ import bpy
 from .registry import SceneRegistry
 from .utils import find_unique_name
 
+_MISSING = object()
+_socket_has_default: dict[type, bool] = {} # socket class -> whether it has a default_value
+
 class RMInput(object):
     def __init__(self, node_graph):
         self.value: any = None
@@ -28,20 +31,36 @@ class RMNode(object):
         self.values: dict[str, any] = {} # input identifier -> any
 
         for input in node.inputs.values():
+            identifier = input.identifier
             if input.is_linked:
-                if len(input.links) != 1:
+                # `links` has to search the node tree, so only query it once
+                links = input.links
+                if len(links) != 1:
                     node_graph.registry.warn("Multi-input links are not supported!")
                     continue
                 
-                link = input.links[0]
-                self.links[input.identifier] = (link.from_node.name, link.from_socket.identifier)
+                link = links[0]
+                self.links[identifier] = (link.from_node.name, link.from_socket.identifier)
             
-            if hasattr(input, "default_value"):
-                value = input.default_value
-                if not isinstance(value, (int, float, str)):
-                    value = list(value)
-                self.values[input.identifier] = value
+            # Whether a socket has a value only depends on its class, avoid failing lookups for the others
+            socket_type = type(input)
+            if _socket_has_default.get(socket_type, True):
+                value = getattr(input, "default_value", _MISSING)
+                _socket_has_default[socket_type] = value is not _MISSING
+                if value is not _MISSING:
+                    if not isinstance(value, (int, float, str)):
+                        value = list(value)
+                    self.values[identifier] = value
     
+    def clone(self, node_graph):
+        # Shares the Blender node, but links and values can be changed independently
+        node = RMNode.__new__(RMNode)
+        node.node_graph = node_graph
+        node.bl_node = self.bl_node
+        node.links = dict(self.links)
+        node.values = dict(self.values)
+        return node
+
     def input(self, name: str):
         input = RMInput(self.node_graph)
         input.value = self.values.get(name)
@@ -53,66 +72,86 @@ class RMNodeGraph(object):
         self.name = name
         self.registry = registry
         self.nodes: dict[str, RMNode] = {} # node.name -> RMNode
+        self._consumers: dict[(str, str), set[(str, str)]] = {} # (from_node.name, from_output.name) -> {(node.name, input identifier)}
 
         for node in node_tree.nodes.values():
-            self.nodes[node.name] = RMNode(self, node)
+            self.add_node(node.name, RMNode(self, node))
     
+    def clone(self, name: str):
+        graph = RMNodeGraph.__new__(RMNodeGraph)
+        graph.name = name
+        graph.registry = self.registry
+        graph.nodes = {}
+        graph._consumers = {}
+        for (node_name, node) in self.nodes.items():
+            graph.add_node(node_name, node.clone(graph))
+        return graph
+
+    def add_node(self, node_name, node: RMNode):
+        self.nodes[node_name] = node
+        for (inp, link) in node.links.items():
+            self._consumers.setdefault(link, set()).add((node_name, inp))
+
     def delete_node(self, node_name):
         if node_name is None:
             return
         
-        for (other_name, node) in self.nodes.items():
-            for (input_name, link) in node.links.items():
-                if link[0] == node_name:
-                    self.registry.warn(f"cannot remove node '{node_name}' as '{other_name}'.'{input_name}' still relies on output '{link[1]}'!")
-                    return
+        for (link, consumers) in self._consumers.items():
+            if link[0] == node_name and consumers:
+                (other_name, input_name) = next(iter(consumers))
+                self.registry.warn(f"cannot remove node '{node_name}' as '{other_name}'.'{input_name}' still relies on output '{link[1]}'!")
+                return
         
-        del self.nodes[node_name]
+        node = self.nodes.pop(node_name)
+        for (inp, link) in node.links.items():
+            self._consumers[link].discard((node_name, inp))
 
-    # @todo this could be made more efficient if the graph was double linked
     def replace_link(self, old_link, new_link):
-        for node in self.nodes.values():
-            for (inp, link) in list(node.links.items()):
-                if link == old_link:
-                    if new_link is None:
-                        del node.links[inp]
-                    else:
-                        node.links[inp] = new_link
+        for (node_name, inp) in self._consumers.pop(old_link, ()):
+            node = self.nodes[node_name]
+            if new_link is None:
+                del node.links[inp]
+            else:
+                node.links[inp] = new_link
+                self._consumers.setdefault(new_link, set()).add((node_name, inp))
     
     def replace_link_with_value(self, old_link, value):
-        for node in self.nodes.values():
-            for (inp, link) in list(node.links.items()):
-                if link == old_link:
-                    del node.links[inp]
-                    node.values[inp] = value # @todo casting?
+        for (node_name, inp) in self._consumers.pop(old_link, ()):
+            node = self.nodes[node_name]
+            del node.links[inp]
+            node.values[inp] = value # @todo casting?
     
     def apply_renaming(self, renaming: dict[str, str]):
         old_nodes = self.nodes
         self.nodes = {}
+        self._consumers = {}
 
         for (old_name, new_name) in renaming.items():
             node = old_nodes[old_name]
-            self.nodes[new_name] = node
             for (inp, (link_node, link_output)) in node.links.items():
                 node.links[inp] = (renaming[link_node], link_output)
+            self.add_node(new_name, node)
 
     def use_labels_as_names(self):
         renaming = {}
         used_names = set()
+        counters = {}
         for (old_name, node) in self.nodes.items():
-            new_name = find_unique_name(used_names, node.bl_node.label or node.bl_node.name)
+            new_name = find_unique_name(used_names, node.bl_node.label or node.bl_node.name, counters)
             renaming[old_name] = new_name
         self.apply_renaming(renaming)
     
     def avoid_names(self, used_names: set[str]):
         renaming = {}
+        counters = {}
         for old_name in self.nodes.keys():
-            new_name = find_unique_name(used_names, old_name)
+            new_name = find_unique_name(used_names, old_name, counters)
             renaming[old_name] = new_name
         self.apply_renaming(renaming)
 
     def remove_muted_nodes(self):
-        for (node_name, node) in list(self.nodes.items()):
+        # replace_link only rewires links and never adds or removes nodes, so no copy is needed
+        for (node_name, node) in self.nodes.items():
             if not node.bl_node.mute:
                 continue
             
@@ -126,23 +165,35 @@ class RMNodeGraph(object):
                 
                 self.replace_link((node_name, output.identifier), link)
 
+    def _find_nodes(self, bl_type):
+        # Collect the matching nodes up front, as the caller is going to delete them
+        return [ (node_name, node) for (node_name, node) in self.nodes.items() if isinstance(node.bl_node, bl_type) ]
+
     def remove_reroute_nodes(self):
-        for (node_name, node) in list(self.nodes.items()):
-            if isinstance(node.bl_node, bpy.types.NodeReroute):
-                assert(len(node.bl_node.inputs) == 1)
-                assert(len(node.bl_node.outputs) == 1)
+        for (node_name, node) in self._find_nodes(bpy.types.NodeReroute):
+            assert(len(node.bl_node.inputs) == 1)
+            assert(len(node.bl_node.outputs) == 1)
 
-                in_id = node.bl_node.inputs[0].identifier
-                out_id = node.bl_node.outputs[0].identifier
+            in_id = node.bl_node.inputs[0].identifier
+            out_id = node.bl_node.outputs[0].identifier
 
-                self.replace_link((node_name, out_id), node.links.get(in_id))
-                self.delete_node(node_name)
+            self.replace_link((node_name, out_id), node.links.get(in_id))
+            self.delete_node(node_name)
 
     def remove_layout_nodes(self):
-        for (node_name, node) in list(self.nodes.items()):
-            if isinstance(node.bl_node, bpy.types.NodeFrame):
-                self.delete_node(node_name)
+        for (node_name, node) in self._find_nodes(bpy.types.NodeFrame):
+            self.delete_node(node_name)
     
+    def _inlined_group(self, node_tree: bpy.types.NodeTree, max_depth):
+        # Groups are often shared by many materials, so only build and inline each one once per export
+        key = (node_tree.as_pointer(), max_depth)
+        graph = self.registry.node_graphs.get(key)
+        if graph is None:
+            graph = RMNodeGraph(self.registry, self.name, node_tree)
+            graph.inline_node_groups_recursively(max_depth)
+            self.registry.node_graphs[key] = graph
+        return graph.clone(self.name)
+
     # @todo we do not support casting via GroupOutput yet
     # (e.g., a color A connected to a float GroupOutput B connected to a color input C causes the color
     # at C to become black and white, but since we directly connect A->C we do not get this effect)
@@ -151,22 +202,24 @@ class RMNodeGraph(object):
             self.registry.warn("Maximum depth reached while inlining node group")
             return
         
-        for (node_name, node) in list(self.nodes.items()):
-            if not isinstance(node.bl_node, bpy.types.ShaderNodeGroup):
-                continue
-            
-            sub_graph = RMNodeGraph(self.registry, self.name, node.bl_node.node_tree)
-            sub_graph.inline_node_groups_recursively(max_depth - 1)
+        group_nodes = self._find_nodes(bpy.types.ShaderNodeGroup)
+        if not group_nodes:
+            return  # Most materials do not use groups at all
+
+        NodeGroupInput = bpy.types.NodeGroupInput
+        NodeGroupOutput = bpy.types.NodeGroupOutput
+        for (node_name, node) in group_nodes:
+            sub_graph = self._inlined_group(node.bl_node.node_tree, max_depth - 1)
             sub_graph.avoid_names(set(self.nodes.keys()))
 
             groupinputs: list[str] = []
             groupoutput: str = None
 
             for (sub_node_name, sub_node) in sub_graph.nodes.items():
-                if isinstance(sub_node.bl_node, bpy.types.NodeGroupInput):
+                if isinstance(sub_node.bl_node, NodeGroupInput):
                     groupinputs.append(sub_node_name)
                     continue
-                elif isinstance(sub_node.bl_node, bpy.types.NodeGroupOutput):
+                elif isinstance(sub_node.bl_node, NodeGroupOutput):
                     if sub_node.bl_node.is_active_output:
                         groupoutput = sub_node_name
                         # we keep this node, because its outputs might be referenced and we want
@@ -175,7 +228,7 @@ class RMNodeGraph(object):
                         continue
 
                 assert(sub_node_name not in self.nodes)
-                self.nodes[sub_node_name] = sub_node
+                self.add_node(sub_node_name, sub_node)
             
             for input in node.bl_node.inputs.values():
                 for groupinput in groupinputs:
@@ -1,144 +1,59 @@
-# This is a copy of the io_mesh_ply/export_ply.py (except the save function) from Blender
-# for the purpose of being a (proposed) fix for https://developer.blender.org/T99249
-# Will be removed soon. Apparently, it is fixed now
+# Binary PLY writer for the meshes of the exporter.
+# The header follows io_mesh_ply/export_ply.py from Blender
 
 import bpy
+import numpy as np
 
 
-def _write_binary(fw, ply_verts: list, ply_faces: list) -> None:
-    from struct import pack
-
-    # Vertex data
-    # ---------------------------
-
-    for v, normal, uv, color in ply_verts:
-        fw(pack("<3f", *v.co))
-        if normal is not None:
-            fw(pack("<3f", *normal))
-        if uv is not None:
-            fw(pack("<2f", *uv))
-        if color is not None:
-            fw(pack("<4B", *color))
-
-    # Face data
+def _write_header(fw, vertex_count, face_count, use_normals, use_uv) -> None:
+    # Header
     # ---------------------------
 
-    for pf in ply_faces:
-        length = len(pf)
-        fw(pack(f"<B{length}I", length, *pf))
-
-
-def _write_ascii(fw, ply_verts: list, ply_faces: list) -> None:
-
-    # Vertex data
-    # ---------------------------
-
-    for v, normal, uv, color in ply_verts:
-        fw(b"%.6f %.6f %.6f" % v.co[:])
-        if normal is not None:
-            fw(b" %.6f %.6f %.6f" % normal[:])
-        if uv is not None:
-            fw(b" %.6f %.6f" % uv)
-        if color is not None:
-            fw(b" %u %u %u %u" % color)
-        fw(b"\n")
-
-    # Face data
-    # ---------------------------
-
-    for pf in ply_faces:
-        fw(b"%d" % len(pf))
-        for index in pf:
-            fw(b" %d" % index)
-        fw(b"\n")
-
-
-def save_mesh(filepath, bm, use_ascii, use_normals, use_uv, use_color):
-    uv_lay = bm.loops.layers.uv.active
-    col_lay = bm.loops.layers.color.active
-
-    use_uv = use_uv and uv_lay is not None
-    use_color = use_color and col_lay is not None
-    normal = uv = color = None
-
-    ply_faces = []
-    ply_verts = []
-    ply_vert_map = {}
-    ply_vert_id = 0
-
-    for f in bm.faces:
-        pf = []
-        ply_faces.append(pf)
+    fw(b"ply\n")
+    fw(b"format binary_little_endian 1.0\n")
+    fw(b"comment Created by Blender %s - www.blender.org\n" %
+        bpy.app.version_string.encode("utf-8"))
+
+    fw(b"element vertex %d\n" % vertex_count)
+    fw(
+        b"property float x\n"
+        b"property float y\n"
+        b"property float z\n"
+    )
+    if use_normals:
+        fw(
+            b"property float nx\n"
+            b"property float ny\n"
+            b"property float nz\n"
+        )
+    if use_uv:
+        fw(
+            b"property float s\n"
+            b"property float t\n"
+        )
 
-        for loop in f.loops:
-            v = loop.vert
+    fw(b"element face %d\n" % face_count)
+    fw(b"property list uchar uint vertex_indices\n")
+    fw(b"end_header\n")
 
-# Begin change diff to upstream Blender (6th. July 2022)
-            if use_uv:
-                uv = loop[uv_lay].uv[:]
-            if use_normals:
-                normal = v.normal if f.smooth else f.normal
-            if use_color:
-                color = tuple(int(x * 255.0) for x in loop[col_lay])
 
-            map_id = (v.co[:], normal[:], uv, color)
+# Writes a triangle mesh given as numpy array of its corners, i.e., one row of
+# position, normal (and uv) per triangle corner. Identical corners are merged into one vertex.
+def write_corner_mesh(filepath, corners: np.ndarray, use_uv):
+    (verts, first_use, indices) = np.unique(corners, axis=0, return_index=True, return_inverse=True)
 
-            # Identify unique vertex.
-            if (_id := ply_vert_map.get(map_id)) is not None:
-                pf.append(_id)
-                continue
-# End of change diff to upstream Blender
+    # Keep the vertices in order of their first use, like the former bmesh based export did
+    order = np.argsort(first_use)
+    remap = np.empty_like(order)
+    remap[order] = np.arange(len(order))
+    verts = verts[order]
+    indices = remap[indices.reshape(-1)].reshape(-1, 3)
 
-            ply_verts.append((v, normal, uv, color))
-            ply_vert_map[map_id] = ply_vert_id
-            pf.append(ply_vert_id)
-            ply_vert_id += 1
+    faces = np.empty(len(indices), dtype=[("count", "u1"), ("indices", "<u4", 3)])
+    faces["count"] = 3
+    faces["indices"] = indices
 
     with open(filepath, "wb") as file:
-        fw = file.write
-        file_format = b"ascii" if use_ascii else b"binary_little_endian"
-
-        # Header
-        # ---------------------------
-
-        fw(b"ply\n")
-        fw(b"format %s 1.0\n" % file_format)
-        fw(b"comment Created by Blender %s - www.blender.org\n" %
-            bpy.app.version_string.encode("utf-8"))
-
-        fw(b"element vertex %d\n" % len(ply_verts))
-        fw(
-            b"property float x\n"
-            b"property float y\n"
-            b"property float z\n"
-        )
-        if use_normals:
-            fw(
-                b"property float nx\n"
-                b"property float ny\n"
-                b"property float nz\n"
-            )
-        if use_uv:
-            fw(
-                b"property float s\n"
-                b"property float t\n"
-            )
-        if use_color:
-            fw(
-                b"property uchar red\n"
-                b"property uchar green\n"
-                b"property uchar blue\n"
-                b"property uchar alpha\n"
-            )
-
-        fw(b"element face %d\n" % len(ply_faces))
-        fw(b"property list uchar uint vertex_indices\n")
-        fw(b"end_header\n")
-
-        # Geometry
-        # ---------------------------
-
-        if use_ascii:
-            _write_ascii(fw, ply_verts, ply_faces)
-        else:
-            _write_binary(fw, ply_verts, ply_faces)
+        _write_header(file.write, len(verts), len(faces), use_normals=True, use_uv=use_uv)
+        np.ascontiguousarray(verts, dtype="<f4").tofile(file)
+        faces.tofile(file)
@@ -1,32 +1,53 @@
 import bpy
 import os
 import re
+import string
 
+from concurrent.futures import ThreadPoolExecutor
+
+from .addon_preferences import get_prefs
 from .utils import find_unique_name
 from .xml_node import XMLNode
 
 
+_INVALID_NAME_RE = re.compile(r"[^a-zA-Z0-9_\- ]")
+_VALID_NAME_CHARS = frozenset(string.ascii_letters + string.digits + "_- ")
+_INVALID_NAME_TABLE = { c: "_" for c in range(128) if chr(c) not in _VALID_NAME_CHARS }
+
+
 class Token(object):
     def __init__(self, id, name):
         self.name_full = id
         self.name = name
-    
-    def __contains__(self, key):
-        return key == "name_full"
 
 class SceneRegistry(object):
     def __init__(self, path, depsgraph, settings, op):
         self.names: set[str] = set()
+        self.name_counters: dict[str, int] = {}
         self.converted: dict[str, dict] = {}
+        self.resolved_paths: dict[(str, str), str] = {} # (raw filepath, library) -> absolute filepath
+        self.node_graphs: dict[(int, int), object] = {} # (node tree pointer, depth) -> inlined RMNodeGraph
 
         self.path = path
         self.depsgraph = depsgraph
         self.settings = settings
         self.operator = op
+
+        # Preferences do not change during an export
+        prefs = get_prefs()
+        self.mesh_dir_name: str = prefs.mesh_dir_name
+        self.tex_dir_name: str = prefs.tex_dir_name
+
+        self._io_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+        self._io_jobs = []
+        self._created_dirs: set[str] = set()
+        self.claimed_files: set[str] = set() # output files (relative to path) owned by an exported datablock
+        self.texture_copies: dict[(str, str), str] = {} # (source file, texture file) -> claimed texture file
     
     def _make_unique_name(self, name: str):
-        name = re.sub("[^a-zA-Z0-9_\\- ]", "_", name)
-        return find_unique_name(self.names, name)
+        # translate is much faster than the regex, but the table only covers ASCII
+        name = name.translate(_INVALID_NAME_TABLE) if name.isascii() else _INVALID_NAME_RE.sub("_", name)
+        return find_unique_name(self.names, name, self.name_counters)
 
     def _build_reference(self, node: XMLNode, name: str):
         if "id" not in node.attributes:
@@ -37,19 +58,66 @@ class SceneRegistry(object):
         kw["id"] = node.attributes["id"]
         return XMLNode("ref", **kw)
 
-    def export(self, original: bpy.types.Object, export_fn):
+    def export(self, original: bpy.types.Object, export_fn, *args):
+        # Calls export_fn(*args) the first time `original` is seen, afterwards returns references to its result
         # TODO: full_name might not be unique
-        full_name = original.name_full if "name_full" in original else original.name
-        full_name += "/" + original.__class__.__name__
+        name_full = getattr(original, "name_full", None)
+        full_name = (name_full if name_full is not None else original.name) + "/" + type(original).__name__
         if full_name in self.converted:
             conv = self.converted[full_name]
             if isinstance(conv, list):
                 return [ self._build_reference(node, original.name) for node in conv ]
             return self._build_reference(conv, original.name)
         
-        self.converted[full_name] = export_fn("TODO")
+        self.converted[full_name] = export_fn(*args)
         return self.converted[full_name]
     
+    def make_dirs(self, filepath: str):
+        # Output directories are only created once something is written into them
+        dirname = os.path.dirname(filepath)
+        if dirname not in self._created_dirs:
+            os.makedirs(dirname, exist_ok=True)
+            self._created_dirs.add(dirname)
+
+    def claim_files(self, name: str, filenames_fn) -> list[str]:
+        # Every output file must only be written by a single exported datablock, otherwise two of them could write
+        # it at the same time in the background. If any of the files for `name` (as given by `filenames_fn`) is
+        # taken already, the ones for name.000, name.001, ... are used instead
+        candidate = name
+        index = 0
+        while True:
+            filenames = filenames_fn(candidate)
+            if self.claimed_files.isdisjoint(filenames):
+                self.claimed_files.update(filenames)
+                return filenames
+            candidate = f"{name}.{index:03d}"
+            index += 1
+
+    def submit_io(self, fn, *args, on_error=None):
+        # Only for plain file I/O, the Blender API must not be used from worker threads!
+        # If the job fails, on_error(error) is called on the main thread by finish_io instead of raising
+        self._io_jobs.append((self._io_pool.submit(fn, *args), on_error))
+
+    def finish_io(self, raise_errors=True):
+        # Wait for all background jobs and re-raise the first error of those without an error handler
+        jobs = self._io_jobs
+        self._io_jobs = []
+        first_error = None
+        try:
+            for (job, on_error) in jobs:
+                try:
+                    job.result()
+                except Exception as error:
+                    if on_error is not None:
+                        on_error(error)
+                    elif first_error is None:
+                        first_error = error
+        finally:
+            self._io_pool.shutdown()
+
+        if raise_errors and first_error is not None:
+            raise first_error
+
     @property
     def scene(self):
         return self.depsgraph.scene
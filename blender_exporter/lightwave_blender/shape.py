@@ -1,7 +1,8 @@
 import os
-import bmesh
+import posixpath
+import re
+import numpy as np
 
-from .addon_preferences import get_prefs
 from .registry import SceneRegistry
 from .xml_node import XMLNode
 from .materials import export_material
@@ -23,59 +24,98 @@ def get_shape_name_base(obj, inst):
         return f"{obj.original.data.name}-shape"  # We use the original mesh name!
 
 
+_INVALID_FILENAME_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
 def _shape_name_material(name, mat_id):
     return f"_m_{mat_id}_{name}"
 
-def _export_bmesh_by_material(registry: SceneRegistry, me) -> list[(str, str)]:
-    mat_count = len(me.materials)
+def _shape_rel_filepath(registry: SceneRegistry, name, mat_id, mat_count):
+    shape_name = name if mat_count <= 1 else _shape_name_material(name, mat_id)
+    # Relative paths end up in the xml, so always use / as separator
+    return posixpath.join(registry.mesh_dir_name, shape_name + ".ply")
+
+def _claim_shape_files(registry: SceneRegistry, obj) -> list[str]:
+    # Used by both the shortcut for existing files and the actual export, so they always agree on the files.
+    # The mesh returned by to_mesh() is not guaranteed to have the same name or material count as the object
+    # (e.g., for curves or object linked materials), so they are derived from the cached datablock and the
+    # material slots, which are also what the instances use to assign materials.
+    # Like the cache key, the name includes the library, so linked datablocks of the same name get their own files
+    name = _INVALID_FILENAME_RE.sub("_", obj.original.data.name_full)
+    mat_count = max(len(obj.material_slots), 1)
+    return registry.claim_files(name, lambda candidate: [
+        _shape_rel_filepath(registry, candidate, mat_id, mat_count) for mat_id in range(0, mat_count)
+    ])
+
+def _foreach_get(collection, attribute: str, size: int, dtype=np.float32) -> np.ndarray:
+    values = np.empty(len(collection) * size, dtype=dtype)
+    collection.foreach_get(attribute, values)
+    return values.reshape(-1, size) if size > 1 else values
+
+def _mesh_corners(me, use_materials: bool):
+    # Position, normal (and uv) of every triangle corner, gathered in bulk instead of walking a bmesh
+    # Blender's loop triangulation also takes care of concave faces
+    me.calc_loop_triangles()
+    tris = me.loop_triangles
+
+    tri_verts = _foreach_get(tris, "vertices", 3, np.int32).reshape(-1)
+    tri_polys = _foreach_get(tris, "polygon_index", 1, np.int32)
+    # Single material meshes are exported as a whole, so the material indices are not needed
+    tri_mats = _foreach_get(tris, "material_index", 1, np.int32) if use_materials else None
+
+    vert_co = _foreach_get(me.vertices, "co", 3)
+    vert_no = _foreach_get(me.vertices, "normal", 3)
+    tri_no = _foreach_get(tris, "normal", 3)
+    poly_smooth = _foreach_get(me.polygons, "use_smooth", 1, bool)
+
+    # Flat triangles use their own normal (not the one of their polygon), so non-planar faces keep shading like
+    # the triangulated faces did in the bmesh based export. Smooth vertex normals are those of the whole mesh,
+    # i.e., unlike before they are no longer recomputed per material, which removes seams at material borders
+    corner_smooth = np.repeat(poly_smooth[tri_polys], 3)
+    normals = np.where(corner_smooth[:, None], vert_no[tri_verts], np.repeat(tri_no, 3, axis=0))
+    columns = [ vert_co[tri_verts], normals ]
+
+    uv_layer = me.uv_layers.active
+    if uv_layer is not None:
+        tri_loops = _foreach_get(tris, "loops", 3, np.int32).reshape(-1)
+        columns.append(_foreach_get(uv_layer.data, "uv", 2)[tri_loops])
+
+    return (np.hstack(columns), tri_mats, uv_layer is not None)
+
+def _export_mesh_by_material(registry: SceneRegistry, me, rel_filepaths: list[str]) -> list[(str, str)]:
+    from .ply import write_corner_mesh as ply_write
+
+    mat_count = len(rel_filepaths)
     shapes = []
+    mesh_data = None
 
     def _export_for_mat(mat_id, abs_filepath):
-        from .ply import save_mesh as ply_save
-
-        bm = bmesh.new()
-        bm.from_mesh(me)
+        nonlocal mesh_data
+        if mesh_data is None:
+            mesh_data = _mesh_corners(me, use_materials=mat_count > 1)
+        (corners, tri_mats, use_uv) = mesh_data
 
         # remove faces with other materials
         if mat_count > 1:
-            for f in bm.faces:
-                # Remove irrelevant faces
-                # Special case: Assign invalid material indices to the last material 
-                if f.material_index != mat_id and not ((f.material_index < 0 or f.material_index >= mat_count) and mat_id == mat_count-1):
-                    bm.faces.remove(f)
-
-        if len(bm.verts) == 0 or len(bm.faces) == 0 or not bm.is_valid:
-            bm.free()
-            return False
-
-        # Make sure all faces are convex
-        bmesh.ops.connect_verts_concave(bm, faces=bm.faces)
-        bmesh.ops.triangulate(bm, faces=bm.faces)
-
-        bm.normal_update()
+            # Special case: Assign invalid material indices to the last material 
+            mask = tri_mats == mat_id
+            if mat_id == mat_count-1:
+                mask |= (tri_mats < 0) | (tri_mats >= mat_count)
+            corners = corners[np.repeat(mask, 3)]
 
-        ply_save(
-            filepath=abs_filepath,
-            bm=bm,
-            use_ascii=False,
-            use_normals=True,
-            use_uv=True,
-            use_color=False
-        )
+        if len(corners) == 0:
+            return False
 
-        bm.free()
+        # Writing the file does not need Blender anymore, so do it in the background
+        registry.make_dirs(abs_filepath)
+        registry.submit_io(ply_write, abs_filepath, corners, use_uv)
         return True
     
-    if mat_count == 0:
-        # special case if the mesh has no slots available
-        mat_count = 1
-    
-    for mat_id in range(0, mat_count):
-        shape_name = me.name if mat_count <= 1 else _shape_name_material(me.name, mat_id)
-        rel_filepath = os.path.join(get_prefs().mesh_dir_name, shape_name + ".ply")
+    overwrite = registry.settings.overwrite_existing_meshes
+    for (mat_id, rel_filepath) in enumerate(rel_filepaths):
         abs_filepath = os.path.join(registry.path, rel_filepath)
 
-        if os.path.exists(abs_filepath) and not registry.settings.overwrite_existing_meshes:
+        if not overwrite and os.path.exists(abs_filepath):
             # file is already exported
             pass
         elif _export_for_mat(mat_id, abs_filepath):
@@ -85,7 +125,7 @@ def _export_bmesh_by_material(registry: SceneRegistry, me) -> list[(str, str)]:
             # export failed
             continue
         
-        shapes.append(rel_filepath.replace('\\', '/')) # Ensure the shape path is not using \ to keep the xml valid
+        shapes.append(rel_filepath)
     
     return shapes
 
@@ -94,13 +134,22 @@ def export_shape(registry: SceneRegistry, obj) -> list[XMLNode]:
     # TODO: We want the mesh to be evaluated with renderer (or viewer) depending on user input
     # This is not possible currently, as access to `mesh_get_eval_final` (COLLADA) is not available
     # nor is it possible to setup via dependency graph, see https://devtalk.blender.org/t/get-render-dependency-graph/12164
+
+    # Claimed before checking the disk, as files of other shapes might still be queued for writing
+    rel_filepaths = _claim_shape_files(registry, obj)
+
+    # Avoid converting the object to a mesh at all if all its files are already on disk
+    if not registry.settings.overwrite_existing_meshes \
+    and all(os.path.exists(os.path.join(registry.path, filepath)) for filepath in rel_filepaths):
+        return [ XMLNode("shape", type="mesh", filename=filepath) for filepath in rel_filepaths ]
+
     try:
         me = obj.to_mesh(preserve_all_data_layers=False, depsgraph=registry.depsgraph)
     except RuntimeError as e:
         registry.error(f"Could not convert to mesh: {str(e)}")
         return []
 
-    shapes = _export_bmesh_by_material(registry, me)
+    shapes = _export_mesh_by_material(registry, me, rel_filepaths)
     obj.to_mesh_clear()
 
     return [ XMLNode("shape", type="mesh", filename=filepath) for filepath in shapes ]
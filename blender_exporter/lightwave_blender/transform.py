@@ -14,17 +14,17 @@ def _extract_vector(registry: SceneRegistry, input: RMInput):
             "Only constant values for transformations are supported")
 
     if not input.has_value():
-        return [0, 0, 0]
+        return (0, 0, 0)
 
     if isinstance(input.value, float):
-        return [input.value, input.value, input.value]
+        return (input.value, input.value, input.value)
     else:
         return input.value
 
 
 def _export_sca(v):
-    if any((c != 1 for c in v[0:3])):
-        return [XMLNode("scale", value=str_flat_array([ 1/x for x in v[0:3] ]))]
+    if v[0] != 1 or v[1] != 1 or v[2] != 1:
+        return [XMLNode("scale", value=str_flat_array((1/v[0], 1/v[1], 1/v[2])))]
     else:
         return []
 
@@ -41,8 +41,8 @@ def _export_rot(v):
 
 
 def _export_tra(v):
-    if any((c != 0 for c in v[0:3])):
-        return [XMLNode("translate", value=str_flat_array([ -x for x in v[0:3] ]))]
+    if v[0] != 0 or v[1] != 0 or v[2] != 0:
+        return [XMLNode("translate", value=str_flat_array((-v[0], -v[1], -v[2])))]
     else:
         return []
 
@@ -54,7 +54,7 @@ def _export_vector_mapping(registry: SceneRegistry, node: RMNode):
     loc = _extract_vector(
         registry, node.input("Location"))
 
-    rot = [r * 180 / math.pi for r in rot]  # rad to deg
+    rot = (math.degrees(rot[0]), math.degrees(rot[1]), math.degrees(rot[2]))  # rad to deg
 
     transforms = export_transform_node(registry, node.input("Vector"))
 
@@ -63,13 +63,13 @@ def _export_vector_mapping(registry: SceneRegistry, node: RMNode):
         transforms += _export_rot(rot)
         transforms += _export_sca(sca)
     elif node.bl_node.vector_type == 'TEXTURE':
-        transforms += _export_sca([1.0/v for v in sca])
-        transforms += list(reversed(_export_rot([-v for v in rot])))
-        transforms += _export_tra([-v for v in loc])
+        transforms += _export_sca((1.0/sca[0], 1.0/sca[1], 1.0/sca[2]))
+        transforms += list(reversed(_export_rot((-rot[0], -rot[1], -rot[2]))))
+        transforms += _export_tra((-loc[0], -loc[1], -loc[2]))
     elif node.bl_node.vector_type == 'NORMAL':
         # No idea why like this
         transforms += _export_rot(rot)
-        transforms += _export_sca([1.0/v for v in sca])
+        transforms += _export_sca((1.0/sca[0], 1.0/sca[1], 1.0/sca[2]))
         # Usually the output has to be normalized here
     elif node.bl_node.vector_type == 'VECTOR':
         transforms += _export_rot(rot)
@@ -84,14 +84,14 @@ def _export_vector_rotate(registry: SceneRegistry, node: RMNode):
     center = _extract_vector(registry, node.input("Center"))
 
     transforms = export_transform_node(registry, node.input("Vector"))
-    transforms += _export_tra([-c for c in center])
+    transforms += _export_tra((-center[0], -center[1], -center[2]))
     if node.bl_node.rotation_type == "EULER_XYZ":
         rot = _extract_vector(registry, node.input("Rotation"))
 
-        rot = [r * 180 / math.pi for r in rot]  # rad to deg
+        rot = (math.degrees(rot[0]), math.degrees(rot[1]), math.degrees(rot[2]))  # rad to deg
 
         if node.bl_node.invert:
-            transforms += list(reversed(_export_rot([-a for a in rot])))
+            transforms += list(reversed(_export_rot((-rot[0], -rot[1], -rot[2]))))
         else:
             transforms += _export_rot(rot)
     else:
@@ -140,6 +140,8 @@ _node_handlers: dict[str, any] = {
     "ShaderNodeTexEnvironment": _export_vector_forward,
 }
 
+_node_dispatch = NodeDispatch(_node_handlers)
+
 
 def export_transform_node(registry: SceneRegistry, input: RMInput) -> XMLNode:
     if not input.is_linked():
@@ -148,10 +150,8 @@ def export_transform_node(registry: SceneRegistry, input: RMInput) -> XMLNode:
     node = input.linked_node()
 
     result = []
-    for (typename, handler) in _node_handlers.items():
-        if hasattr(bpy.types, typename) and isinstance(node.bl_node, getattr(bpy.types, typename)):
-            result += handler(registry, node)
-            break
+    if (handler := _node_dispatch.find(node.bl_node)) is not None:
+        result += handler(registry, node)
     else:
         registry.error(
             f"Node graph {node.node_graph.name} has a node of type {type(node.bl_node).__name__} which is not supported")
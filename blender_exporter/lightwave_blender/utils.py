@@ -1,42 +1,99 @@
+import bpy
+import functools
 import mathutils
 import re
 
 
-def find_unique_name(used: set[str], name: str):
-    unique_name = name
-    index = 0
+def find_unique_name(used: set[str], name: str, counters: dict[str, int] = None):
+    # Candidates are name, name.000, name.001, ...
+    # `counters` (always passed together with the same `used` set) remembers how many
+    # candidates of a name have been taken already, so they do not need to be probed again
+    index = counters.get(name, 0) if counters is not None else 0
 
-    while unique_name in used:
-        unique_name = f"{name}.{index:03d}"
+    while True:
+        unique_name = name if index == 0 else f"{name}.{index - 1:03d}"
         index += 1
+        if unique_name not in used:
+            break
     
+    if counters is not None:
+        counters[name] = index
     used.add(unique_name)
     return unique_name
 
 
+class NodeDispatch(object):
+    # Maps Blender node classes (given by their bpy.types name) to handlers
+    def __init__(self, handlers: dict[str, any]):
+        self.registered: dict[type, any] = {
+            getattr(bpy.types, typename): handler
+            for (typename, handler) in handlers.items()
+            if hasattr(bpy.types, typename)
+        }
+        self.by_type: dict[type, any] = dict(self.registered)
+
+    def find(self, bl_node):
+        # Nodes are usually instances of exactly the registered class, so this is a single dict lookup.
+        # Other classes are resolved via their MRO (most specific registered base wins) and memoized, including misses
+        bl_type = type(bl_node)
+        try:
+            return self.by_type[bl_type]
+        except KeyError:
+            pass
+
+        handler = None
+        for bl_class in bl_type.__mro__:
+            if (handler := self.registered.get(bl_class)) is not None:
+                break
+        self.by_type[bl_type] = handler
+        return handler
+
+
+_INVALID_IDENTIFIER_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
 def escape_identifier(name):
-    return re.sub('[^a-zA-Z0-9_]', '_', name)
+    return _INVALID_IDENTIFIER_RE.sub('_', name)
 
 
 def flat_matrix(matrix):
     return [x for row in matrix for x in row]
 
 
+_FLOAT_FORMAT = "%.5g"
+
+
+@functools.lru_cache(maxsize=4096)
+def _str_float_cached(f: float):
+    return _FLOAT_FORMAT % f
+
+
 def str_float(f: float):
-    return "%.5g" % f
+    # The same values (0.5, 1, ...) recur all over a scene, so only format them once.
+    # 0.0 and -0.0 compare equal but are printed differently, hence they bypass the cache
+    if f == 0:
+        return _FLOAT_FORMAT % f
+    return _str_float_cached(f)
+
+
+# Format string for a whole 4x4 matrix, matching the per-cell output of str_float
+_MATRIX4_FORMAT = ",  ".join([",".join([_FLOAT_FORMAT] * 4)] * 4)
 
 
 def str_flat_matrix(matrix):
+    if len(matrix) == 4 and all(len(row) == 4 for row in matrix):
+        return _MATRIX4_FORMAT % tuple(v for row in matrix for v in row)
+
     return ",  ".join([
-        ",".join([ str_float(v) for v in row ])
+        ",".join([ _FLOAT_FORMAT % v for v in row ])
         for row in matrix
     ])
 
 
 def str_flat_array(array):
     if isinstance(array, float):
-        return str_float(array)
-    return ",".join([str_float(x) for x in array])
+        return _FLOAT_FORMAT % array
+    return ",".join([ _FLOAT_FORMAT % x for x in array ])
 
 
 def orient_camera(matrix, skip_scale=False):
@@ -9,6 +9,10 @@ from .materials import _is_black
 from .transform import export_transform_node
 
 
+# Constant, so only format it once
+_ENVIRONMENT_MAP_MATRIX = str_flat_matrix(ENVIRONMENT_MAP_TRANSFORM)
+
+
 def export_world_background(registry: SceneRegistry, scene: bpy.types.Scene):
     if not scene.world:
         return []
@@ -44,15 +48,16 @@ def _export_background(registry: SceneRegistry, bsdf_node: RMNode):
     strength = bsdf_node.input("Strength")
 
     if not color.is_linked():
-        if not color.has_value() or _is_black(color.value):
+        color_value = color.value
+        if color_value is None or _is_black(color_value):
             return []
 
     emission_scale = 1
     if strength.is_linked():
         registry.error(
             "Only constant values for emission strength are supported")
-    elif strength.has_value():
-        emission_scale = float(strength.value)
+    elif (strength_value := strength.value) is not None:
+        emission_scale = float(strength_value)
     if emission_scale == 0:
         return []
 
@@ -60,9 +65,8 @@ def _export_background(registry: SceneRegistry, bsdf_node: RMNode):
     bg.add_child(export_node(
         registry, color, exposure=emission_scale))
 
-    transforms = []
-    transforms += [XMLNode("matrix", value=str_flat_matrix(ENVIRONMENT_MAP_TRANSFORM))]
-    transforms += export_transform_node(registry, color)
+    transforms = [XMLNode("matrix", value=_ENVIRONMENT_MAP_MATRIX)]
+    transforms.extend(export_transform_node(registry, color))
 
     bg.add("transform").add_children(transforms)
     return [bg]
@@ -73,6 +77,8 @@ _world_handlers: dict[str, any] = {
     "ShaderNodeBackground": _export_background,
 }
 
+_world_dispatch = NodeDispatch(_world_handlers)
+
 
 def _export_world(registry: SceneRegistry, input: RMInput):
     if not input.is_linked():
@@ -85,15 +91,12 @@ def _export_world(registry: SceneRegistry, input: RMInput):
         return []
 
     result = []
-    for (typename, handler) in _world_handlers.items():
-        if hasattr(bpy.types, typename) and isinstance(world_node.bl_node, getattr(bpy.types, typename)):
-            result += handler(registry, world_node)
-            break
+    if (handler := _world_dispatch.find(world_node.bl_node)) is not None:
+        result += handler(registry, world_node)
     else:
         # treat as background
-        transforms = []
-        transforms += [XMLNode("matrix", value=str_flat_matrix(ENVIRONMENT_MAP_TRANSFORM))]
-        transforms += export_transform_node(registry, input)
+        transforms = [XMLNode("matrix", value=_ENVIRONMENT_MAP_MATRIX)]
+        transforms.extend(export_transform_node(registry, input))
 
         bg = XMLNode("light", type="envmap")
         bg.add_child(export_node(registry, input))
@@ -1,6 +1,14 @@
 from .utils import str_float
 
+_ATTRIBUTE_PRIORITY = { "name": 0, "id": 1 }
+
+def _attribute_priority(attr_name: str):
+    return _ATTRIBUTE_PRIORITY.get(attr_name, 2)
+
 class XMLNode:
+    # Scenes consist of lots of nodes, avoid a __dict__ for each of them
+    __slots__ = ("name", "attributes", "children")
+
     def __init__(self, node_name, **attributes):
         self.name = node_name
         self.attributes = attributes
@@ -15,47 +23,91 @@ class XMLNode:
         self.children.append(child)
     
     def add_children(self, children):
-        self.children += children
+        self.children.extend(children)
 
     def add(self, node_name, **attributes):
         child = XMLNode(node_name, **attributes)
-        self.add_child(child)
+        self.children.append(child)
         return child
 
-    def dump(self, ident=0):
-        # Start tag
-        output = "  " * ident
-        output += f"<{self.name}"
+    def clone(self):
+        # Shallow copy, the children are shared with the original node
+        node = XMLNode(self.name, **self.attributes)
+        node.children = list(self.children)
+        return node
 
-        # Attributes
-        priority = ["name", "id"]
-        sorted_attr = sorted(self.attributes.keys(), key=lambda attr: priority.index(attr) if attr in priority else len(priority))
+    def _append_start_tag(self, parts: list[str]):
+        parts.append("<")
+        parts.append(self.name)
+
+        # Attributes, "name" and "id" first
+        attributes = self.attributes
+        sorted_attr = attributes if len(attributes) <= 1 else sorted(attributes, key=_attribute_priority)
         for attr_name in sorted_attr:
-            attr_value = self.attributes[attr_name]
+            attr_value = attributes[attr_name]
             if attr_value is not None:
                 if isinstance(attr_value, bool):
                     attr_value = "true" if attr_value else "false"
                 elif isinstance(attr_value, float):
                     attr_value = str_float(attr_value)
-                output += f" {attr_name}=\"{attr_value}\""
+                parts.append(" ")
+                parts.append(attr_name)
+                parts.append("=\"")
+                parts.append(str(attr_value))
+                parts.append("\"")
+
+    def _dump(self, parts: list[str], ident: int):
+        # Appends the fragments of this node to `parts`, which are joined only once at the end
+        indent_str = "  " * ident
+
+        # Start tag
+        parts.append(indent_str)
+        self._append_start_tag(parts)
 
         if len(self.children) > 0:
-            output += ">\n"
+            parts.append(">\n")
 
             # Children
             for child in self.children:
-                output += child.dump(ident+1) + "\n"
+                child._dump(parts, ident+1)
+                parts.append("\n")
 
             # Close
-            output += "  " * ident
-            output += f"</{self.name}>"
+            parts.append(indent_str)
+            parts.append("</")
+            parts.append(self.name)
+            parts.append(">")
         else:
-            output += "/>"
+            parts.append("/>")
+
+    def dump(self, ident=0):
+        parts = []
+        self._dump(parts, ident)
+        return "".join(parts)
 
-        return output
+    def write(self, fp, ident=0):
+        # Same output as dump(), but streamed into a binary file object
+        indent_str = "  " * ident
+        parts = [indent_str]
+        self._append_start_tag(parts)
+        if len(self.children) > 0:
+            parts.append(">\n")
+            fp.write("".join(parts).encode())
+
+            # Children
+            for child in self.children:
+                child.write(fp, ident+1)
+
+            # Close
+            fp.write(f"{indent_str}</{self.name}>\n".encode())
+        else:
+            parts.append("/>\n")
+            fp.write("".join(parts).encode())
 
 
 class XMLRootNode:
+    __slots__ = ("children",)
+
     def __init__(self):
         self.children = []
 
@@ -63,16 +115,22 @@ class XMLRootNode:
         self.children.append(child)
     
     def add_children(self, children):
-        self.children += children
+        self.children.extend(children)
 
     def add(self, node_name, **attributes):
         child = XMLNode(node_name, **attributes)
-        self.add_child(child)
+        self.children.append(child)
         return child
 
     def dump(self):
         # Children
-        output = ""
+        parts = []
+        for child in self.children:
+            child._dump(parts, 0)
+            parts.append("\n")
+        return "".join(parts)
+
+    def write(self, fp):
+        # Children
         for child in self.children:
-            output += child.dump(0) + "\n"
-        return output
+            child.write(fp, 0)
@@ -1,5 +1,6 @@
 #! /usr/bin/env python3
 
+import fnmatch
 import glob
 import os
 import sys
@@ -9,6 +10,9 @@ import urllib.parse
 import urllib.request
 import re
 import argparse
+import collections
+
+from concurrent.futures import ThreadPoolExecutor
 
 parser = argparse.ArgumentParser(description='Test runner for lightwave')
 parser.add_argument('filenames', metavar='tests', type=str, nargs='*', default=["*/*.xml"],
@@ -17,15 +21,39 @@ parser.add_argument('--unsafe', dest='unsafe_tests', action='store_true',
                     help='include unsafe tests')
 parser.add_argument('--disable-build', dest='disable_build', action='store_true',
                     help='do not build lightwave before running the tests')
+parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                    help='how many tests to run at the same time (default: half the number of cores)')
 
 args = parser.parse_args()
 root_path = os.path.relpath(os.path.dirname(__file__), os.path.curdir)
 build_path = os.path.join(root_path, "build")
 
+target_name_re = re.compile(r"set\s*\(MY_TARGET_NAME\s+([^)\s]+)\s*\)", re.IGNORECASE)
+
+def find_binary_name():
+    # Only parse CMakeLists.txt again if it changed since the name was last cached
+    cmakelists_path = os.path.join(root_path, "CMakeLists.txt")
+    cache_path = os.path.join(build_path, ".binary_name.cache")
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(cmakelists_path):
+            with open(cache_path) as f:
+                if (binary_name := f.read()):
+                    return binary_name
+    except OSError:
+        pass
+
+    with open(cmakelists_path) as f:
+        binary_name = target_name_re.search(f.read())[1]
+    try:
+        with open(cache_path, "w") as f:
+            f.write(binary_name)
+    except OSError:
+        pass # e.g., the build directory does not exist yet
+    return binary_name
+
 try:
-    with open(os.path.join(root_path, "CMakeLists.txt")) as f:
-        binary_name = re.search(r"set\s*\(MY_TARGET_NAME\s+([^)\s]+)\s*\)", f.read(), re.IGNORECASE)[1]
-        lightwave_path = os.path.join(build_path, binary_name)
+    binary_name = find_binary_name()
+    lightwave_path = os.path.join(build_path, binary_name)
 except:
     print(f"Could not determine the name of your renderer")
     exit(1)
@@ -50,22 +78,62 @@ if not args.disable_build:
     except:
         print("Could not build lightwave for you, please make sure 'cmake' is in your PATH environment variable.")
 
+tests_path = os.path.join(root_path, "tests")
+
+def index_tests():
+    # Walk the tests directory once, so arguments can be resolved without probing the disk for each of them
+    files = set()
+    dirs = set()
+    for (dirpath, _, filenames) in os.walk(tests_path):
+        rel_path = os.path.relpath(dirpath, tests_path)
+        parts = () if rel_path == os.curdir else tuple(rel_path.split(os.sep))
+        dirs.add(parts)
+        files.update(parts + (name,) for name in filenames)
+    return files, dirs
+
+def matches_pattern(parts, pattern_parts):
+    # Same rules as glob: wildcards do not cross directories and do not match hidden names
+    return len(parts) == len(pattern_parts) and all(
+        fnmatch.fnmatch(part, pattern) and (not part.startswith(".") or pattern.startswith("."))
+        for (part, pattern) in zip(parts, pattern_parts)
+    )
+
+def resolve_tests(filename, test_files, test_dirs):
+    parts = tuple(part for part in re.split(r"[\\/]", filename) if part not in ("", os.curdir))
+    if os.path.isabs(filename) or os.pardir in parts:
+        # Not inside the tests directory, so the index can not help
+        path = os.path.join(tests_path, filename)
+        if os.path.isfile(path):
+            return [path]
+        elif os.path.isdir(path):
+            return glob.glob(os.path.join(path, "*.xml"))
+        elif os.path.isfile(path + ".xml"):
+            return [path + ".xml"]
+        return glob.glob(path)
+
+    if parts in test_files:
+        matches = [parts]
+    elif parts in test_dirs:
+        matches = [ file for file in test_files if file[:-1] == parts and matches_pattern(file[-1:], ("*.xml",)) ]
+    elif parts and parts[:-1] + (parts[-1] + ".xml",) in test_files:
+        matches = [parts[:-1] + (parts[-1] + ".xml",)]
+    elif glob.has_magic(filename):
+        matches = [ file for file in test_files if matches_pattern(file, parts) ]
+    else:
+        matches = []
+    return [ os.path.join(tests_path, *file) for file in matches ]
+
 tests = []
+test_index = None
 for filename in args.filenames:
     if os.path.isfile(filename):
         tests += [filename]
         continue
-    
-    path = os.path.join(root_path, "tests", filename)
-    if os.path.isfile(path):
-        tests += [path]
-    elif os.path.isdir(path):
-        tests += glob.glob(os.path.join(path, "*.xml"))
-    elif os.path.isfile(path + ".xml"):
-        tests += [path + ".xml"]
-    else:
-        tests += glob.glob(path)
-tests = list(set(tests))
+
+    if test_index is None:
+        test_index = index_tests()
+    tests += resolve_tests(filename, *test_index)
+tests = list(dict.fromkeys(tests))
 
 if len(tests) == 0:
     print("No tests match your input")
@@ -75,33 +143,42 @@ start_time = time.time()
 passed_count = 0
 total_count = 0
 
-print()
-for test in sorted(tests):
-    test_name = test.replace("\\", "/").split("/")[-2:]
-    test_name = "/".join(test_name).split(".")[0]
-    total_count += 1
-    
-    print(f"\033[90m› {test_name}\033[0m", end="", flush=True)
+def run_test(test):
+    # The renders run in their own processes, so threads are enough to run them side by side
     test_start = time.time()
-    r = subprocess.run([ lightwave_path, test ], capture_output=True)
-    elapsed_seconds = time.time() - test_start
-
-    print("\33[02K\r", end="", flush=True)
-    if r.returncode == 0:
-        print(f"\033[92m✓ {test_name} passed\033[0m ({elapsed_seconds:.2f}s)")
-        passed_count += 1
-        continue
+    # Only the end of stderr is reported, so do not keep the whole output of the renderer around
+    with subprocess.Popen([ lightwave_path, test ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as process:
+        stderr_tail = collections.deque(process.stderr, maxlen=6)
+        returncode = process.wait()
+    return returncode, b"".join(stderr_tail), time.time() - test_start
 
-    try:
-        error = r.stderr.decode()
-    except:
-        # Windows still hasn't gotten Unicode right
-        error = r.stderr.decode("utf-16")
+print()
+with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+    tests = sorted(tests)
+    runs = [ executor.submit(run_test, test) for test in tests ]
+
+    # Report results in order, regardless of which test finishes first
+    for (test, run) in zip(tests, runs):
+        test_name = test.replace("\\", "/").split("/")[-2:]
+        test_name = "/".join(test_name).split(".")[0]
+        total_count += 1
+
+        print(f"\033[90m› {test_name}\033[0m", end="", flush=True)
+        (returncode, stderr, elapsed_seconds) = run.result()
+
+        print("\33[02K\r", end="", flush=True)
+        if returncode == 0:
+            print(f"\033[92m✓ {test_name} passed\033[0m ({elapsed_seconds:.2f}s)")
+            passed_count += 1
+            continue
+
+        # Invalid bytes (e.g., from a non UTF-8 console) must not hide the actual error
+        error = stderr.decode("utf-8", errors="replace")
     
-    print(f"\033[91m⨯ {test_name} failed\033[0m")
-    print("\n".join(error.split("\n")[-6:-1]))
-    print()
-    all_passed = False
+        print(f"\033[91m⨯ {test_name} failed\033[0m")
+        print("\n".join(error.split("\n")[-6:-1]))
+        print()
+        all_passed = False
 
 all_passed = passed_count == total_count
 elapsed_seconds = time.time() - start_time